@@ -0,0 +1,104 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from typing import Optional
+
+queue_size = int(os.environ.get("WS_QUEUE_SIZE", default=100))
+
+
+class Subscription:
+	"""
+	A single listener's bounded queue of events for one chat.
+
+	Events are handed over from whichever thread publishes them to the event
+	loop that created the subscription. When the queue is full the listener is
+	considered too slow: its pending events are discarded and it is closed.
+
+	Attributes:
+		chat_id (int): The chat being listened to.
+		dropped (bool): Whether the listener was closed for falling behind.
+	"""
+
+	def __init__(self, chat_id: int, maxsize: int, loop: asyncio.AbstractEventLoop):
+		self.chat_id = chat_id
+		self.dropped = False
+		self.closed = False
+		self._loop = loop
+		self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+	async def get(self) -> Optional[dict]:
+		"""Wait for the next event, or None once the subscription is closed."""
+		if self.closed and self._queue.empty():
+			return None
+		return await self._queue.get()
+
+	def close(self):
+		"""Close the subscription, waking up any pending `get`. Must run on its loop."""
+		if self.closed:
+			return
+		self.closed = True
+		while not self._queue.empty():
+			self._queue.get_nowait()
+		self._queue.put_nowait(None)
+
+	def _offer(self, event: dict):
+		if self.closed:
+			return
+		try:
+			self._queue.put_nowait(event)
+		except asyncio.QueueFull:
+			self.dropped = True
+			self.close()
+
+	def offer(self, event: dict):
+		"""Queue an event from any thread without blocking the publisher."""
+		try:
+			self._loop.call_soon_threadsafe(self._offer, event)
+		except RuntimeError:
+			# The listener's event loop has already shut down.
+			self.closed = True
+
+
+class Broker:
+	"""In-process publish/subscribe hub fanning chat events out to listeners."""
+
+	def __init__(self, maxsize: int = queue_size):
+		self.maxsize = maxsize
+		self._lock = threading.Lock()
+		self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+
+	def subscribe(self, chat_id: int) -> Subscription:
+		"""Start listening to a chat. Must be called from a running event loop."""
+		subscription = Subscription(chat_id, self.maxsize, asyncio.get_running_loop())
+		with self._lock:
+			self._subscriptions[chat_id].add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription: Subscription):
+		with self._lock:
+			listeners = self._subscriptions.get(subscription.chat_id)
+			if listeners is not None:
+				listeners.discard(subscription)
+				if not listeners:
+					del self._subscriptions[subscription.chat_id]
+
+	def publish(self, chat_id: int, event: dict) -> int:
+		"""
+		Deliver an event to every listener of a chat.
+
+		Args:
+			chat_id (int): The chat the event belongs to.
+			event (dict): A JSON-serializable event.
+
+		Returns:
+			int: The number of listeners the event was offered to.
+		"""
+		with self._lock:
+			listeners = list(self._subscriptions.get(chat_id, ()))
+		for subscription in listeners:
+			subscription.offer(event)
+		return len(listeners)
+
+
+broker = Broker()
@@ -1,17 +1,28 @@
+import base64
 import json
 import os
 from datetime import datetime
+from typing import NamedTuple, Optional
 from uuid import uuid4
-from sqlmodel import Session, SQLModel, create_engine, select
-from fastapi import HTTPException
-
+from sqlalchemy import and_, event, func, or_, update
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import Session, SQLModel, select
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from backend.broker import broker
+from backend.engine import create_db_engine, create_async_db_engine
 from backend.models.entities import (
 	UserInDB,
 	UserChatLinkInDB,
 	ChatInDB,
 	MessageInDB
 )
-from backend.models.exception import EntityNotFoundException, DuplicateEntityException
+from backend.models.exception import (
+	EntityNotFoundException,
+	DuplicateEntityException,
+	InvalidCursorException
+)
 from backend.models.user import (
     User,
     UserResponse,
@@ -28,30 +39,7 @@ from backend.models.chat import(
 	MessageResponse
 )
 
-if os.environ.get("DB_LOCATION") == "RDS":
-    username = os.environ.get("PG_USERNAME")
-    password = os.environ.get("PG_PASSWORD")
-    endpoint = os.environ.get("PG_ENDPOINT")
-    port = os.environ.get("PG_PORT")
-    db_url = f"postgresql://{username}:{password}@{endpoint}:{port}/{username}"
-    echo = False
-    connect_args = {}
-else:
-    db_url = "sqlite:///backend/pony_express.db"
-    echo = True
-    connect_args = {"check_same_thread": False}
-
-engine = create_engine(
-    db_url,
-    echo=echo,
-    connect_args=connect_args,
-)
-
-engine = create_engine(
-	"sqlite:///backend/pony_express.db",
-	echo=True,
-	connect_args={"check_same_thread": False},
-)
+engine = create_db_engine()
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
@@ -61,18 +49,242 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+# ******************************
+#		ASYNC SESSIONS
+# ******************************
+# Async route handlers depend on `get_async_session` and call the sync query
+# functions in this module through `await session.run_sync(fn, *args)`.
+# With DB_ASYNC=true that is an `AsyncSession` on an async engine (asyncpg on
+# RDS, aiosqlite locally) and queries run on the event loop. Otherwise each call
+# is handed to Starlette's threadpool with a regular `Session`.
+
+async_mode = os.environ.get("DB_ASYNC", "false").lower() in ("1", "true")
+
+class ThreadpoolSession:
+    """Adapts a sync `Session` to the `run_sync` interface of `AsyncSession`."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+if async_mode:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async_engine = create_async_db_engine()
+
+    async def get_async_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+else:
+    async def get_async_session(session: Session = Depends(get_session)):
+        return ThreadpoolSession(session)
+
+# ******************************
+#		CHAT COUNTERS
+# ******************************
+# `ChatInDB.message_count` and `ChatInDB.user_count` are adjusted in the same
+# flush that inserts or deletes a message or a `UserChatLinkInDB` row, so they
+# commit or roll back together with the change. Bulk inserts that bypass the ORM
+# must run `backend.repair_counters` afterwards.
+
+def _adjust_chat_counter(connection, chat_id: int, counter: str, delta: int):
+	column = getattr(ChatInDB, counter)
+	connection.execute(
+		update(ChatInDB)
+		.where(ChatInDB.id == chat_id)
+		.values({counter: column + delta})
+	)
+
+@event.listens_for(MessageInDB, "after_insert")
+def _message_inserted(_mapper, connection, message: MessageInDB):
+	_adjust_chat_counter(connection, message.chat_id, "message_count", 1)
+
+@event.listens_for(MessageInDB, "after_delete")
+def _message_deleted(_mapper, connection, message: MessageInDB):
+	_adjust_chat_counter(connection, message.chat_id, "message_count", -1)
+
+@event.listens_for(UserChatLinkInDB, "after_insert")
+def _member_added(_mapper, connection, link: UserChatLinkInDB):
+	_adjust_chat_counter(connection, link.chat_id, "user_count", 1)
+
+@event.listens_for(UserChatLinkInDB, "after_delete")
+def _member_removed(_mapper, connection, link: UserChatLinkInDB):
+	_adjust_chat_counter(connection, link.chat_id, "user_count", -1)
+
+# ******************************
+#		QUERY HELPERS
+# ******************************
+
+class Collection(NamedTuple):
+	"""
+	A sorted, bounded slice of a collection along with its total size.
+
+	Attributes:
+		count (int): The total number of rows matching the query.
+		items (list): The rows in the requested slice.
+	"""
+	count: int
+	items: list
+
+def count_rows(session: Session, statement) -> int:
+	"""
+	Count the rows a select statement would return without loading them.
+
+	Args:
+		statement: The select statement to count.
+
+	Returns:
+		int: The number of matching rows.
+	"""
+	return session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+
+def get_collection(session: Session, statement, column, id_column,
+				   limit: int, offset: int = 0) -> Collection:
+	"""
+	Fetch a slice of `statement` ordered by (column, id_column) along with its total count.
+
+	Sorting, limiting and counting all happen in SQL, so the rows loaded depend
+	on `limit` rather than on the size of the table.
+
+	Args:
+		statement: The select statement to run.
+		column: The column to sort by.
+		id_column: A unique column used to break ties.
+		limit (int): The maximum number of rows to return.
+		offset (int, optional): The number of rows to skip. Defaults to 0.
+
+	Returns:
+		Collection: The total count and the requested rows.
+	"""
+	count = count_rows(session, statement)
+	items = session.exec(statement.order_by(column, id_column).offset(offset).limit(limit)).all()
+	return Collection(count=count, items=items)
+
+class Page(NamedTuple):
+	"""
+	A single page of a keyset-paginated query.
+
+	Attributes:
+		items (list): The rows in this page, in ascending sort order.
+		next_cursor (str): Cursor for the rows after this page, or None.
+		prev_cursor (str): Cursor for the rows before this page, or None.
+	"""
+	items: list
+	next_cursor: Optional[str]
+	prev_cursor: Optional[str]
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+	"""
+	Encode a row's position in a sort order as an opaque cursor.
+
+	Args:
+		sort (str): The name of the attribute the collection is sorted by.
+		value: The row's value for that attribute.
+		row_id (int): The row's ID, used to break ties.
+
+	Returns:
+		str: A URL-safe cursor string.
+	"""
+	if isinstance(value, datetime):
+		value = value.isoformat()
+	payload = json.dumps([sort, value, row_id], separators=(",", ":"))
+	return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, column) -> tuple:
+	"""
+	Decode a cursor created by `encode_cursor`.
+
+	Args:
+		cursor (str): The cursor supplied by the client.
+		sort (str): The attribute the collection is currently sorted by.
+		column: The column the collection is sorted by.
+
+	Returns:
+		tuple: The (value, row_id) position encoded in the cursor.
+
+	Raises:
+		InvalidCursorException: If the cursor is malformed or was issued for a different sort order.
+	"""
+	try:
+		padded = cursor + "=" * (-len(cursor) % 4)
+		cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+		if cursor_sort != sort or not isinstance(row_id, int):
+			raise ValueError(cursor)
+		if column.type.python_type is datetime:
+			value = datetime.fromisoformat(value)
+		return value, row_id
+	except (ValueError, TypeError):
+		raise InvalidCursorException(cursor=cursor)
+
+def get_page(session: Session, statement, sort: str, column, id_column,
+			 limit: int, before: Optional[str] = None, after: Optional[str] = None) -> Page:
+	"""
+	Fetch one page of `statement` ordered by (column, id_column) using keyset pagination.
+
+	Only `limit + 1` rows are read, so the cost of a page does not depend on the
+	size of the underlying collection.
+
+	Args:
+		statement: The select statement to paginate.
+		sort (str): The name of the attribute being sorted by, recorded in cursors.
+		column: The column to sort by.
+		id_column: A unique column used to break ties.
+		limit (int): The maximum number of rows to return.
+		before (str, optional): Only return rows before this cursor.
+		after (str, optional): Only return rows after this cursor.
+
+	Returns:
+		Page: The rows in ascending order along with next/prev cursors.
+	"""
+	if after is not None:
+		value, row_id = decode_cursor(after, sort, column)
+		statement = statement.where(or_(column > value, and_(column == value, id_column > row_id)))
+	if before is not None:
+		value, row_id = decode_cursor(before, sort, column)
+		statement = statement.where(or_(column < value, and_(column == value, id_column < row_id)))
+
+	backwards = before is not None and after is None
+	if backwards:
+		statement = statement.order_by(column.desc(), id_column.desc())
+	else:
+		statement = statement.order_by(column, id_column)
+
+	rows = list(session.exec(statement.limit(limit + 1)).all())
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+	if backwards:
+		rows.reverse()
+
+	cursors = [encode_cursor(sort, getattr(row, sort), row.id) for row in (rows[:1] + rows[-1:])]
+	first, last = (cursors[0], cursors[-1]) if cursors else (None, None)
+	if backwards:
+		return Page(items=rows, next_cursor=last, prev_cursor=first if has_more else None)
+	return Page(
+		items=rows,
+		next_cursor=last if has_more else None,
+		prev_cursor=first if after is not None else None,
+	)
+
 # Open 'db' and begin reading the json file
 with open("backend/fake_db.json", "r") as f:
     DB = json.load(f)
     
-def get_all_users(session: Session) -> list[UserInDB]:
+def get_all_users(session: Session, sort: str = "id", limit: int = 100, offset: int = 0) -> Collection:
 	"""
-	Retrieve all users from the database.
+	Retrieve a sorted slice of the users in the database.
+
+	Args:
+		sort (str, optional): The attribute to sort the users by. Defaults to "id".
+		limit (int, optional): The maximum number of users to return. Defaults to 100.
+		offset (int, optional): The number of users to skip. Defaults to 0.
 
 	Returns:
-		list[User]: A list of User objects representing all the users in the database.
+		Collection: The total number of users and the requested User objects.
 	"""
-	return session.exec(select(UserInDB)).all()
+	statement = select(UserInDB)
+	return get_collection(session, statement, getattr(UserInDB, sort), UserInDB.id, limit, offset)
 
 def get_user_by_id(session: Session, user_id: int) -> UserInDB:
 	"""
@@ -116,34 +328,49 @@ def create_user(session: Session, user_create: UserCreate) -> UserInDB:
 		raise DuplicateEntityException(entity_name="User", entity_id=user_create.id)
 	
 
-def get_user_chats(session: Session, user_id: int) -> list[ChatInDB]:
+def get_user_chats(session: Session, user_id: int, sort: str = "name",
+				   limit: int = 100, offset: int = 0) -> Collection:
 	"""
-	Retrieves the chats associated with a given user ID.
+	Retrieves a sorted slice of the chats associated with a given user ID.
 
 	Args:
 		user_id (str): The ID of the user.
+		sort (str, optional): The attribute to sort the chats by. Defaults to "name".
+		limit (int, optional): The maximum number of chats to return. Defaults to 100.
+		offset (int, optional): The number of chats to skip. Defaults to 0.
 
 	Returns:
-		list[Chat]: A list of Chat objects associated with the user.
+		Collection: The total number of the user's chats and the requested Chat objects.
 
 	Raises:
-		EntityNotFoundException: If no chats are found for the given user ID.
+		EntityNotFoundException: If no user exists with the given ID.
 	"""
-	user = session.get(UserInDB, user_id)
-	if user:
-		return user.chats
-	raise EntityNotFoundException(entity_name="User", entity_id=user_id)
+	if session.get(UserInDB, user_id) is None:
+		raise EntityNotFoundException(entity_name="User", entity_id=user_id)
+	statement = (
+		select(ChatInDB)
+		.join(UserChatLinkInDB, UserChatLinkInDB.chat_id == ChatInDB.id)
+		.where(UserChatLinkInDB.user_id == user_id)
+		.options(selectinload(ChatInDB.owner))
+	)
+	return get_collection(session, statement, getattr(ChatInDB, sort), ChatInDB.id, limit, offset)
 
 
 
-def get_all_chats(session: Session) -> list[ChatInDB]:
+def get_all_chats(session: Session, sort: str = "name", limit: int = 100, offset: int = 0) -> Collection:
 	"""
-	Retrieve all chats from the database.
+	Retrieve a sorted slice of the chats in the database.
+
+	Args:
+		sort (str, optional): The attribute to sort the chats by. Defaults to "name".
+		limit (int, optional): The maximum number of chats to return. Defaults to 100.
+		offset (int, optional): The number of chats to skip. Defaults to 0.
 
 	Returns:
-		list[Chat]: A list of Chat objects representing all the chats in the database.
+		Collection: The total number of chats and the requested Chat objects.
 	"""
-	return session.exec(select(ChatInDB)).all()
+	statement = select(ChatInDB).options(selectinload(ChatInDB.owner))
+	return get_collection(session, statement, getattr(ChatInDB, sort), ChatInDB.id, limit, offset)
 
 def get_chat_by_id(session: Session, chat_id: int) -> ChatInDB:
 	"""
@@ -164,6 +391,45 @@ def get_chat_by_id(session: Session, chat_id: int) -> ChatInDB:
 		return chat
 	raise EntityNotFoundException(entity_name="Chat", entity_id=chat_id)
 
+class ChatSummary(NamedTuple):
+	"""
+	A chat together with the sizes of its collections.
+
+	Attributes:
+		chat (ChatInDB): The chat, with its owner loaded.
+		message_count (int): The number of messages in the chat.
+		user_count (int): The number of users in the chat.
+	"""
+	chat: ChatInDB
+	message_count: int
+	user_count: int
+
+def get_chat_summary(session: Session, chat_id: int) -> ChatSummary:
+	"""
+	Retrieve a chat, its owner and its message and user counts in a single query.
+
+	The counts are read from the counters maintained on `ChatInDB`, so neither
+	the messages nor the members of the chat are touched.
+
+	Args:
+		chat_id (str): The ID of the chat.
+
+	Returns:
+		ChatSummary: The chat along with its message and user counts.
+
+	Raises:
+		EntityNotFoundException: If the chat with the given ID does not exist.
+	"""
+	statement = (
+		select(ChatInDB)
+		.where(ChatInDB.id == chat_id)
+		.options(joinedload(ChatInDB.owner))
+	)
+	chat = session.exec(statement).first()
+	if chat is None:
+		raise EntityNotFoundException(entity_name="Chat", entity_id=chat_id)
+	return ChatSummary(chat=chat, message_count=chat.message_count, user_count=chat.user_count)
+
 def update_chat(session: Session, chat_id: int, chat_update: ChatUpdate) -> ChatInDB:
 	"""
 	Update the chat with the given chat_id using the provided chat_update.
@@ -199,40 +465,101 @@ def delete_chat(session: Session, chat_id: int):
 	session.delete(chat)
 	session.commit()
 
-def get_messages_by_id(session: Session, chat_id: int) -> list[MessageInDB]:
+def get_messages_by_id(session: Session, chat_id: int, sort: str = "created_at", limit: int = 100,
+					   before: Optional[str] = None, after: Optional[str] = None) -> Page:
 	"""
-	Retrieves a list of messages by chat ID.
+	Retrieves one page of messages by chat ID.
 
 	Args:
 		chat_id (str): The ID of the chat.
+		sort (str, optional): The attribute to sort the messages by. Defaults to "created_at".
+		limit (int, optional): The maximum number of messages to return. Defaults to 100.
+		before (str, optional): Only return messages before this cursor.
+		after (str, optional): Only return messages after this cursor.
 
 	Returns:
-		list[Message]: A list of Message objects.
+		Page: A page of Message objects with next/prev cursors.
 
 	Raises:
-		EntityNotFoundException: If the chat ID is not found in the database.
+		InvalidCursorException: If a cursor is malformed.
+	"""
+	statement = (
+		select(MessageInDB)
+		.where(MessageInDB.chat_id == chat_id)
+		.options(selectinload(MessageInDB.user))
+	)
+	column = getattr(MessageInDB, sort)
+	return get_page(session, statement, sort, column, MessageInDB.id, limit, before, after)
+
+def get_users_in_chat(session: Session, chat_id: int, sort: str = "id",
+					  limit: int = 100, offset: int = 0) -> Collection:
 	"""
+	Retrieves a sorted slice of the users in a chat based on the chat ID.
 
-	return session.exec(select(MessageInDB).where(MessageInDB.chat_id == chat_id)).all()
-	raise EntityNotFoundException(entity_name="Chat", entity_id=chat_id)
+	Args:
+		chat_id (str): The ID of the chat.
+		sort (str, optional): The attribute to sort the users by. Defaults to "id".
+		limit (int, optional): The maximum number of users to return. Defaults to 100.
+		offset (int, optional): The number of users to skip. Defaults to 0.
 
-def get_users_in_chat(session: Session, chat_id: int) -> list[UserInDB]:
+	Returns:
+		Collection: The total number of users in the chat and the requested User objects.
+
+	Raises:
+		EntityNotFoundException: If the chat with the specified ID does not exist.
 	"""
-	Retrieves a list of users in a chat based on the chat ID.
+	if session.get(ChatInDB, chat_id) is None:
+		raise EntityNotFoundException(entity_name="Chat", entity_id=chat_id)
+	statement = (
+		select(UserInDB)
+		.join(UserChatLinkInDB, UserChatLinkInDB.user_id == UserInDB.id)
+		.where(UserChatLinkInDB.chat_id == chat_id)
+	)
+	return get_collection(session, statement, getattr(UserInDB, sort), UserInDB.id, limit, offset)
+
+def add_chat_member(session: Session, chat_id: int, user_id: int) -> UserChatLinkInDB:
+	"""
+	Add a user to a chat.
+
+	Membership changes go through `UserChatLinkInDB` so that `ChatInDB.user_count`
+	is kept in sync.
 
 	Args:
 		chat_id (str): The ID of the chat.
+		user_id (str): The ID of the user to add.
 
 	Returns:
-		list[User]: A list of User objects representing the users in the chat.
+		UserChatLinkInDB: The new membership.
 
 	Raises:
-		EntityNotFoundException: If the chat with the specified ID does not exist.
+		EntityNotFoundException: If the chat or user does not exist.
+		DuplicateEntityException: If the user is already in the chat.
 	"""
-	chat = session.get(ChatInDB, chat_id)
-	if chat:
-		return chat.users
-	raise EntityNotFoundException(entity_name="Chat", entity_id=chat_id)
+	get_chat_by_id(session, chat_id)
+	get_user_by_id(session, user_id)
+	if session.get(UserChatLinkInDB, (user_id, chat_id)) is not None:
+		raise DuplicateEntityException(entity_name="UserChatLink", entity_id=user_id)
+	link = UserChatLinkInDB(user_id=user_id, chat_id=chat_id)
+	session.add(link)
+	session.commit()
+	return link
+
+def remove_chat_member(session: Session, chat_id: int, user_id: int):
+	"""
+	Remove a user from a chat.
+
+	Args:
+		chat_id (str): The ID of the chat.
+		user_id (str): The ID of the user to remove.
+
+	Raises:
+		EntityNotFoundException: If the user is not in the chat.
+	"""
+	link = session.get(UserChatLinkInDB, (user_id, chat_id))
+	if link is None:
+		raise EntityNotFoundException(entity_name="UserChatLink", entity_id=user_id)
+	session.delete(link)
+	session.commit()
 
 def create_new_message(session: Session, message_create: MessageCreate, user: UserInDB, chat_id: int) -> MessageResponse:
 	try:
@@ -242,7 +569,9 @@ def create_new_message(session: Session, message_create: MessageCreate, user: Us
 		session.add(message)
 		session.commit()
 		session.refresh(message)
-		return MessageResponse(message=message)
+		response = MessageResponse(message=message)
+		broker.publish(message.chat_id, {"type": "message", **response.model_dump(mode="json")})
+		return response
 	except:
 		pass
 
@@ -5,6 +5,7 @@ from sqlmodel import SQLModel, Session, create_engine, select
 
 from backend.models.entities import *
 from backend.database import engine
+from backend.repair_counters import repair_counters
 
 SQLModel.metadata.create_all(engine)
 
@@ -125,12 +126,14 @@ def seed_database():
     chat_count = add_chats()
     message_count = add_messages()
     link_count = add_user_chat_links()
+    counters = repair_counters(engine)
 
     return {
         "user_count": user_count,
         "chat_count": chat_count,
         "message_count": message_count,
         "link_count": link_count,
+        "counters": counters,
     }
 
 
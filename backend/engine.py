@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import create_engine
+
+# ******************************
+#		CONFIGURATION
+# ******************************
+
+def _env_bool(name: str, default: bool) -> bool:
+	return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+def database_url() -> str:
+	"""
+	Build the database URL from the environment.
+
+	DB_LOCATION=RDS connects to Postgres using the PG_* variables, otherwise
+	DB_URL is used, defaulting to the local SQLite file.
+	"""
+	if os.environ.get("DB_LOCATION") == "RDS":
+		username = os.environ.get("PG_USERNAME")
+		password = os.environ.get("PG_PASSWORD")
+		endpoint = os.environ.get("PG_ENDPOINT")
+		port = os.environ.get("PG_PORT")
+		return f"postgresql://{username}:{password}@{endpoint}:{port}/{username}"
+	return os.environ.get("DB_URL", "sqlite:///backend/pony_express.db")
+
+echo = _env_bool("DB_ECHO", False)
+pool_size = int(os.environ.get("DB_POOL_SIZE", 5))
+max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+pool_recycle = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+pool_pre_ping = _env_bool("DB_POOL_PRE_PING", True)
+sqlite_journal_mode = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+sqlite_synchronous = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+sqlite_busy_timeout = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))  # milliseconds
+
+async_drivers = {
+	"postgresql": "postgresql+asyncpg",
+	"sqlite": "sqlite+aiosqlite",
+}
+
+# ******************************
+#		POOL WAIT STATS
+# ******************************
+
+class PoolWaitStats:
+	"""
+	Running totals of how long requests waited to check out a pooled connection.
+
+	Attributes:
+		checkouts (int): The number of connections checked out.
+		timeouts (int): The number of checkouts that gave up after `pool_timeout`.
+		total_wait (float): The total time spent waiting, in seconds.
+		max_wait (float): The longest single wait, in seconds.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self.checkouts = 0
+			self.timeouts = 0
+			self.total_wait = 0.0
+			self.max_wait = 0.0
+
+	def record(self, wait: float, timed_out: bool = False):
+		with self._lock:
+			if timed_out:
+				self.timeouts += 1
+			else:
+				self.checkouts += 1
+			self.total_wait += wait
+			self.max_wait = max(self.max_wait, wait)
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			return {
+				"checkouts": self.checkouts,
+				"timeouts": self.timeouts,
+				"total_wait_seconds": self.total_wait,
+				"max_wait_seconds": self.max_wait,
+			}
+
+pool_wait_stats = PoolWaitStats()
+
+class _TimedCheckout:
+	def _do_get(self):
+		start = time.perf_counter()
+		try:
+			connection = super()._do_get()
+		except PoolTimeoutError:
+			pool_wait_stats.record(time.perf_counter() - start, timed_out=True)
+			raise
+		pool_wait_stats.record(time.perf_counter() - start)
+		return connection
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+	"""A `QueuePool` that records checkout wait times in `pool_wait_stats`."""
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+	"""An `AsyncAdaptedQueuePool` that records checkout wait times in `pool_wait_stats`."""
+
+# ******************************
+#		ENGINE FACTORY
+# ******************************
+
+def _engine_options(url, async_engine: bool) -> dict:
+	options = {
+		"echo": echo,
+		"poolclass": TimedAsyncQueuePool if async_engine else TimedQueuePool,
+		"pool_size": pool_size,
+		"max_overflow": max_overflow,
+		"pool_timeout": pool_timeout,
+	}
+	if url.get_backend_name() == "sqlite":
+		if not async_engine:
+			options["connect_args"] = {"check_same_thread": False}
+	else:
+		options["pool_recycle"] = pool_recycle
+		options["pool_pre_ping"] = pool_pre_ping
+	return options
+
+def _tune_sqlite(engine: Engine):
+	@event.listens_for(engine, "connect")
+	def set_sqlite_pragmas(dbapi_connection, _connection_record):
+		cursor = dbapi_connection.cursor()
+		cursor.execute(f"PRAGMA journal_mode={sqlite_journal_mode}")
+		cursor.execute(f"PRAGMA synchronous={sqlite_synchronous}")
+		cursor.execute(f"PRAGMA busy_timeout={sqlite_busy_timeout}")
+		cursor.close()
+
+def create_db_engine(url: Optional[str] = None) -> Engine:
+	"""
+	Create the application's engine from configuration.
+
+	Postgres engines get pool sizing, recycling and pre-ping; SQLite engines have
+	their journal mode, synchronous level and busy timeout set on every new
+	connection. Checkout wait times are recorded in `pool_wait_stats`.
+
+	Args:
+		url (str, optional): The database URL. Defaults to `database_url()`.
+
+	Returns:
+		Engine: The configured engine.
+	"""
+	url = make_url(url or database_url())
+	engine = create_engine(url, **_engine_options(url, async_engine=False))
+	if url.get_backend_name() == "sqlite":
+		_tune_sqlite(engine)
+	return engine
+
+def create_async_db_engine(url: Optional[str] = None):
+	"""
+	Create an async engine from configuration, using the async driver for the backend.
+
+	Args:
+		url (str, optional): The database URL. Defaults to `database_url()`.
+
+	Returns:
+		AsyncEngine: The configured async engine.
+	"""
+	from sqlalchemy.ext.asyncio import create_async_engine
+
+	url = make_url(url or database_url())
+	url = url.set(drivername=async_drivers[url.get_backend_name()])
+	engine = create_async_engine(url, **_engine_options(url, async_engine=True))
+	if url.get_backend_name() == "sqlite":
+		_tune_sqlite(engine.sync_engine)
+	return engine
@@ -8,7 +8,11 @@ from mangum import Mangum
 from backend.routers.chats import chats_router
 from backend.routers.users import users_router
 from backend.auth import auth_router
-from backend.models.exception import EntityNotFoundException, DuplicateEntityException
+from backend.models.exception import (
+    EntityNotFoundException,
+    DuplicateEntityException,
+    InvalidCursorException,
+)
 from backend.database import create_db_and_tables
 
 @asynccontextmanager
@@ -69,4 +73,19 @@ def handle_duplicate_entity(
                 "entity_id": exception.entity_id,
             },
         },
-    )
\ No newline at end of file
+    )
+
+@app.exception_handler(InvalidCursorException)
+def handle_invalid_cursor(
+    _request: Request,
+    exception: InvalidCursorException,
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=422,
+        content={
+            "detail": {
+                "type": "invalid_cursor",
+                "cursor": exception.cursor,
+            },
+        },
+    )
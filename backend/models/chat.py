@@ -3,7 +3,7 @@ from datetime import datetime
 from sqlmodel import SQLModel
 from typing import Optional
 
-from backend.models.meta import MetaData, ChatMetaData
+from backend.models.meta import MetaData, ChatMetaData, PageMetaData
 from backend.models.user import User, UserList
 
 class Chat(SQLModel):
@@ -16,11 +16,15 @@ class Chat(SQLModel):
 		user_ids (list[str]): The list of user IDs participating in the chat.
 		owner_id (str): The ID of the chat owner.
 		created_at (datetime): The timestamp when the chat was created.
+		message_count (int): The number of messages in the chat.
+		user_count (int): The number of users in the chat.
 	"""
 	id: int
 	name: str
 	owner: User
 	created_at: datetime
+	message_count: int
+	user_count: int
 
 class ChatCollection(BaseModel):
 	"""
@@ -41,7 +45,7 @@ class Message(SQLModel):
 	created_at: datetime
 
 class MessageCollection(BaseModel):
-	meta: MetaData
+	meta: PageMetaData
 	messages: list[Message]
 
 class MessageList(BaseModel):
@@ -40,6 +40,8 @@ class ChatInDB(SQLModel, table=True):
     name: str
     owner_id: int = Field(foreign_key="users.id")
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    message_count: int = Field(default=0)
+    user_count: int = Field(default=0)
 
     owner: UserInDB = Relationship()
     users: list[UserInDB] = Relationship(
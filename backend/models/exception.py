@@ -27,3 +27,13 @@ class DuplicateEntityException(Exception):
 		self.entity_name = entity_name
 		self.entity_id = entity_id
 
+class InvalidCursorException(Exception):
+	"""
+	Exception raised when a pagination cursor cannot be decoded.
+
+	Attributes:
+		cursor (str): The cursor supplied by the client.
+	"""
+
+	def __init__(self, *, cursor: str):
+		self.cursor = cursor
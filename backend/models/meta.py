@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class MetaData(BaseModel):
 	"""
@@ -13,3 +14,15 @@ class MetaData(BaseModel):
 class ChatMetaData(BaseModel):
 	message_count: int
 	user_count: int
+
+class PageMetaData(MetaData):
+	"""
+	Represents metadata for a single page of a keyset-paginated collection.
+
+	Attributes:
+		count (int): The number of items in this page.
+		next_cursor (str): Opaque cursor for the page after this one, if any.
+		prev_cursor (str): Opaque cursor for the page before this one, if any.
+	"""
+	next_cursor: Optional[str] = None
+	prev_cursor: Optional[str] = None
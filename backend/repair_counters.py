@@ -0,0 +1,79 @@
+import json
+
+from sqlalchemy import func, inspect, or_, select, text, update
+from sqlmodel import SQLModel
+
+from backend.models.entities import ChatInDB, MessageInDB, UserChatLinkInDB
+from backend.database import engine
+
+COUNTER_COLUMNS = ["message_count", "user_count"]
+
+
+def add_counter_columns(engine) -> list[str]:
+    """Add the counter columns to a `chats` table created before they existed."""
+    existing = {column["name"] for column in inspect(engine).get_columns("chats")}
+    added = [name for name in COUNTER_COLUMNS if name not in existing]
+    with engine.begin() as connection:
+        for name in added:
+            connection.execute(text(
+                f"ALTER TABLE chats ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"
+            ))
+    return added
+
+
+def recompute_counters(engine) -> int:
+    """
+    Recompute every chat's counters with one bulk UPDATE.
+
+    Only chats whose stored counters have drifted are written, and the number of
+    those chats is returned.
+    """
+    message_count = (
+        select(func.count(MessageInDB.id))
+        .where(MessageInDB.chat_id == ChatInDB.id)
+        .scalar_subquery()
+    )
+    user_count = (
+        select(func.count(UserChatLinkInDB.user_id))
+        .where(UserChatLinkInDB.chat_id == ChatInDB.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(ChatInDB)
+        .where(or_(
+            ChatInDB.message_count != message_count,
+            ChatInDB.user_count != user_count,
+        ))
+        .values(message_count=message_count, user_count=user_count)
+    )
+    with engine.begin() as connection:
+        return connection.execute(statement).rowcount
+
+
+def repair_counters(engine=engine) -> dict:
+    SQLModel.metadata.create_all(engine)
+    added = add_counter_columns(engine)
+    repaired = recompute_counters(engine)
+
+    return {
+        "added_columns": added,
+        "repaired_chats": repaired,
+    }
+
+
+def lambda_handler(event, context):
+    try:
+        result = repair_counters()
+        return {
+            "statusCode": 200,
+            "body": json.dumps(result),
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)}),
+        }
+
+
+if __name__ == "__main__":
+    print(json.dumps(repair_counters()))
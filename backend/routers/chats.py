@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Literal
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status
+from typing import Literal, Optional
 from backend import database as db
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from backend.models.chat import (
 	Chat,
@@ -15,72 +17,84 @@ from backend.models.chat import (
 	MessageCreate
 )
 from backend.auth import get_current_user
+from backend.broker import broker
+from backend.models.exception import EntityNotFoundException
 from backend.models.entities import UserInDB
 from backend.models.user import UserCollection
 
 chats_router = APIRouter(prefix="/chats", tags=["Chats"])
 
+# Maximum number of messages/users embedded by `GET /chats/{chat_id}?include=...`
+INCLUDE_LIMIT = 100
+
 @chats_router.get("",
 				  response_model=ChatCollection,
 				  description="Retrieve all chats and sort them based on the specified attribute.")
-def get_all_chats(sort: Literal["id", "created_at", "name"] = "name", 
-				  session: Session = Depends(db.get_session)):
+async def get_all_chats(sort: Literal["id", "created_at", "name"] = "name", 
+				  limit: int = Query(100, ge=1, le=1000),
+				  offset: int = Query(0, ge=0),
+				  session: AsyncSession = Depends(db.get_async_session)):
 	"""
 	Retrieve all chats and sort them based on the specified attribute.
 
 	Args:
 		sort (Literal["id", "created_at", "name"], optional): The attribute to sort the chats by. Defaults to "name".
+		limit (int, optional): The maximum number of chats to return. Defaults to 100.
+		offset (int, optional): The number of chats to skip. Defaults to 0.
 
 	Returns:
 		ChatCollection: A collection of chats, sorted based on the specified attribute.
 	"""
-	sort_key = lambda chat: getattr(chat, sort)
-	chats = db.get_all_chats(session)
+	def build(session: Session) -> ChatCollection:
+		chats = db.get_all_chats(session, sort, limit, offset)
+		return ChatCollection(
+			meta={"count": chats.count},
+			chats=chats.items
+		)
 
-	return ChatCollection(
-		meta={"count": len(chats)},
-		chats=sorted(chats, key=sort_key)
-	)
+	return await session.run_sync(build)
 
 
 @chats_router.get("/{chat_id}",
 				  response_model=ChatResponse,
 				  response_model_exclude_none=True,
 				  description="Retrieve a chat by its ID.")
-def get_chat_by_id(chat_id: str,
-				   session: Session = Depends(db.get_session),
+async def get_chat_by_id(chat_id: str,
+				   session: AsyncSession = Depends(db.get_async_session),
 				   include: list[str] = Query(None)):
 	"""
 	Retrieve a chat by its ID.
 
 	Parameters:
 	- chat_id (str): The ID of the chat to retrieve.
+	- include (list[str], optional): "messages" and/or "users" to embed the first
+	  INCLUDE_LIMIT items of those collections.
 
 	Returns:
 	- ChatResponse: The response containing the chat information.
 	"""
-	chat = db.get_chat_by_id(session, chat_id)
-	if include == None:
-		return ChatResponse(meta={"message_count": len(chat.messages),
-							"user_count": len(chat.users)},
-						chat=chat
-						)
-	else:
+	include = include or []
+
+	def build(session: Session) -> ChatResponse:
+		summary = db.get_chat_summary(session, chat_id)
 		return ChatResponse(
 			meta={
-				"message_count": len(chat.messages),
-				"user_count": len(chat.users)
+				"message_count": summary.message_count,
+				"user_count": summary.user_count
 				},
-			chat=chat,
-			messages = chat.messages if "messages" in include else None,
-			users = chat.users if "users" in include else None
+			chat=summary.chat,
+			messages=db.get_messages_by_id(session, chat_id, limit=INCLUDE_LIMIT).items if "messages" in include else None,
+			users=db.get_users_in_chat(session, chat_id, limit=INCLUDE_LIMIT).items if "users" in include else None
 		)
 
+	return await session.run_sync(build)
+
 
 @chats_router.put("/{chat_id}",
 				  response_model=UpdateChatResponse,
 				  description="Update a chat with the given chat_id.")
-def update_chat(chat_id: str, chat_update: ChatUpdate, session: Session = Depends(db.get_session)):
+async def update_chat(chat_id: str, chat_update: ChatUpdate,
+					  session: AsyncSession = Depends(db.get_async_session)):
 	"""
 	Update a chat with the given chat_id.
 
@@ -91,7 +105,10 @@ def update_chat(chat_id: str, chat_update: ChatUpdate, session: Session = Depend
 	Returns:
 		ChatResponse: The response containing the updated chat information.
 	"""
-	return UpdateChatResponse(chat=db.update_chat(session, chat_id, chat_update))
+	def build(session: Session) -> UpdateChatResponse:
+		return UpdateChatResponse(chat=db.update_chat(session, chat_id, chat_update))
+
+	return await session.run_sync(build)
 
 # @chats_router.delete("/{chat_id}",
 # 					 status_code=204,
@@ -113,59 +130,127 @@ def update_chat(chat_id: str, chat_update: ChatUpdate, session: Session = Depend
 
 @chats_router.get("/{chat_id}/messages",
 				  response_model=MessageCollection,
-				  description="Get messages by chat ID and sort them based on the specified attribute.")
-def get_messages_by_chat_id(
+				  description="Get a page of messages by chat ID, sorted based on the specified attribute.")
+async def get_messages_by_chat_id(
 		chat_id: str,
 		sort: Literal["id", "created_at", "text", "user_id"] = "created_at",
-		session: Session = Depends(db.get_session)
+		limit: int = Query(100, ge=1, le=1000),
+		before: Optional[str] = None,
+		after: Optional[str] = None,
+		session: AsyncSession = Depends(db.get_async_session)
 		):
 	"""
-	Get messages by chat ID and sort them based on the specified attribute.
+	Get a page of messages by chat ID, sorted based on the specified attribute.
 
 	Parameters:
 	- chat_id (str): The ID of the chat.
 	- sort (Literal["id", "created_at", "text", "user_id"], optional): The attribute to sort the messages by. Defaults to "created_at".
+	- limit (int, optional): The maximum number of messages to return. Defaults to 100.
+	- before (str, optional): Cursor from `meta.prev_cursor`; returns the messages before it.
+	- after (str, optional): Cursor from `meta.next_cursor`; returns the messages after it.
 
 	Returns:
-	- MessageCollection: A collection of messages with metadata.
+	- MessageCollection: A page of messages with metadata and next/prev cursors.
 
 	"""
-	sort_key = lambda message: getattr(message, sort)
-	messages = db.get_messages_by_id(session, chat_id)
-	return MessageCollection(
-		meta={"count": len(messages)},
-		messages=sorted(messages, key=sort_key)
-	)
+	def build(session: Session) -> MessageCollection:
+		page = db.get_messages_by_id(session, chat_id, sort, limit, before, after)
+		return MessageCollection(
+			meta={
+				"count": len(page.items),
+				"next_cursor": page.next_cursor,
+				"prev_cursor": page.prev_cursor,
+			},
+			messages=page.items
+		)
+
+	return await session.run_sync(build)
 	
 @chats_router.get("/{chat_id}/users",
 				  response_model=UserCollection,
 				  description="Get the users in a chat.")
-def get_users_in_chat(chat_id: str,
+async def get_users_in_chat(chat_id: str,
 					  sort: Literal["id", "created_at"] = "id",
-					  session: Session = Depends(db.get_session)):
+					  limit: int = Query(100, ge=1, le=1000),
+					  offset: int = Query(0, ge=0),
+					  session: AsyncSession = Depends(db.get_async_session)):
 	"""
 	Get the users in a chat.
 
 	Parameters:
 	- chat_id (str): The ID of the chat.
 	- sort (Literal["id", "created_at"], optional): The field to sort the users by. Defaults to "id".
+	- limit (int, optional): The maximum number of users to return. Defaults to 100.
+	- offset (int, optional): The number of users to skip. Defaults to 0.
 
 	Returns:
 	- UserCollection: A collection of users in the chat, sorted based on the specified field.
 	"""
-	sort_key = lambda user: getattr(user, sort)
-	users = db.get_users_in_chat(session, chat_id)
-	return UserCollection(
-		meta={"count": len(users)},
-		users=sorted(users, key=sort_key)
-	)
+	def build(session: Session) -> UserCollection:
+		users = db.get_users_in_chat(session, chat_id, sort, limit, offset)
+		return UserCollection(
+			meta={"count": users.count},
+			users=users.items
+		)
+
+	return await session.run_sync(build)
 
 @chats_router.post("/{chat_id}/messages",
 				   response_model=MessageResponse,
 				   status_code=201
 				   )
-def create_message(chat_id: int,
+async def create_message(chat_id: int,
 					message_create: MessageCreate,
 					user: UserInDB = Depends(get_current_user), 
-					session: Session = Depends(db.get_session)):
-	return db.create_new_message(session, message_create, user, chat_id)
\ No newline at end of file
+					session: AsyncSession = Depends(db.get_async_session)):
+	return await session.run_sync(db.create_new_message, message_create, user, chat_id)
+
+@chats_router.websocket("/{chat_id}/ws")
+async def chat_events(websocket: WebSocket,
+					  chat_id: int,
+					  token: Optional[str] = None,
+					  session: Session = Depends(db.get_session)):
+	"""
+	Stream new messages in a chat over a WebSocket.
+
+	The access token is read from the `token` query parameter or a bearer
+	`Authorization` header. Each message created in the chat is sent as a JSON
+	event `{"type": "message", "message": {...}}`. Connections that fall more
+	than `broker.maxsize` events behind are closed with code 1013 and should
+	reconnect and catch up through `GET /chats/{chat_id}/messages`.
+
+	Parameters:
+	- chat_id (int): The ID of the chat to listen to.
+	- token (str, optional): The access token, if not sent as a header.
+	"""
+	if token is None:
+		scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+		token = credentials if scheme.lower() == "bearer" else None
+	try:
+		if token is None:
+			raise HTTPException(status_code=401)
+		get_current_user(session=session, token=token)
+		db.get_chat_by_id(session, chat_id)
+	except (HTTPException, EntityNotFoundException):
+		await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+		return
+	finally:
+		session.close()
+
+	await websocket.accept()
+	subscription = broker.subscribe(chat_id)
+
+	async def watch_for_disconnect():
+		async for _ in websocket.iter_text():
+			pass
+		subscription.close()
+
+	watcher = asyncio.create_task(watch_for_disconnect())
+	try:
+		while (event := await subscription.get()) is not None:
+			await websocket.send_json(event)
+		if subscription.dropped:
+			await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+	finally:
+		watcher.cancel()
+		broker.unsubscribe(subscription)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from typing import Literal
 from sqlmodel import Session
 from backend import database as db
@@ -23,6 +23,8 @@ users_router = APIRouter(prefix="/users", tags=["Users"])
 				  description="Retrieve a collection of users from the database.")
 def get_users(
 	sort: Literal["id", "created_at"] = "id",
+	limit: int = Query(100, ge=1, le=1000),
+	offset: int = Query(0, ge=0),
 	session: Session = Depends(db.get_session)
 ):
 	"""
@@ -30,16 +32,17 @@ def get_users(
 
 	Args:
 		sort (Literal["id", "created_at"], optional): The field to sort the users by. Defaults to "id".
+		limit (int, optional): The maximum number of users to return. Defaults to 100.
+		offset (int, optional): The number of users to skip. Defaults to 0.
 
 	Returns:
 		UserCollection: The collection of users, sorted by the specified field.
 	"""
-	sort_key = lambda user: getattr(user, sort)
-	users = db.get_all_users(session)
+	users = db.get_all_users(session, sort, limit, offset)
 
 	return UserCollection(
-		meta={"count": len(users)},
-		users=sorted(users, key=sort_key)
+		meta={"count": users.count},
+		users=users.items
 	)
 
 @users_router.get("/me",
@@ -96,6 +99,8 @@ def create_user(user_create: UserCreate, session: Session = Depends(db.get_sessi
 				  description="Retrieve the chats for a specific user.")
 def get_user_chats(user_id: int, 
 				   sort: Literal["name", "id", "created_at"] = "name",
+				   limit: int = Query(100, ge=1, le=1000),
+				   offset: int = Query(0, ge=0),
 				   session: Session = Depends(db.get_session)):
 	"""
 	Retrieve the chats for a specific user.
@@ -103,13 +108,14 @@ def get_user_chats(user_id: int,
 	Args:
 		user_id (str): The ID of the user.
 		sort (Literal["name", "id", "created_at"], optional): The field to sort the chats by. Defaults to "name".
+		limit (int, optional): The maximum number of chats to return. Defaults to 100.
+		offset (int, optional): The number of chats to skip. Defaults to 0.
 
 	Returns:
 		ChatCollection: The collection of chats for the user, sorted based on the specified field.
 	"""
-	sort_key = lambda chat: getattr(chat, sort)
-	chats = db.get_user_chats(session, user_id)
+	chats = db.get_user_chats(session, user_id, sort, limit, offset)
 	return ChatCollection(
-		meta={"count": len(chats)},
-		chats=sorted(chats, key=sort_key)
+		meta={"count": chats.count},
+		chats=chats.items
 	)
\ No newline at end of file
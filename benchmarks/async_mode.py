@@ -0,0 +1,116 @@
+"""
+Compare requests/sec of the threadpool and async database modes.
+
+Starts `uvicorn backend.main:app` once with DB_ASYNC=false and once with
+DB_ASYNC=true, drives the chat read routes at a fixed concurrency and prints
+the results as JSON.
+
+    python -m benchmarks.async_mode --concurrency 200 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROUTES = [
+    "/chats",
+    "/chats/{chat_id}",
+    "/chats/{chat_id}/messages",
+    "/chats/{chat_id}/users",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(async_mode: bool, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DB_ASYNC": "true" if async_mode else "false"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/chats", params={"limit": 1})
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise TimeoutError(f"server at {base_url} did not start")
+
+
+async def drive(base_url: str, chat_id: int, concurrency: int, duration: float) -> dict:
+    paths = [route.format(chat_id=chat_id) for route in ROUTES]
+    completed = 0
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(offset: int):
+            nonlocal completed, errors
+            i = offset
+            while time.monotonic() < deadline:
+                response = await client.get(paths[i % len(paths)])
+                i += 1
+                if response.status_code == 200:
+                    completed += 1
+                else:
+                    errors += 1
+
+        start = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - start
+
+    return {
+        "requests": completed,
+        "errors": errors,
+        "requests_per_sec": round(completed / elapsed, 1),
+    }
+
+
+async def run_mode(async_mode: bool, args) -> dict:
+    port = free_port()
+    server = start_server(async_mode, port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url)
+        await drive(base_url, args.chat_id, args.concurrency, min(args.duration, 2))
+        return await drive(base_url, args.chat_id, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main(args):
+    results = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "threadpool": await run_mode(False, args),
+        "async": await run_mode(True, args),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--chat-id", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,59 @@
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+
+from backend import database as db
+from backend.models.chat import MessageCreate
+from backend.models.entities import UserInDB, ChatInDB, MessageInDB
+from backend.repair_counters import recompute_counters
+
+def make_session() -> Session:
+	engine = create_engine(
+		"sqlite://",
+		connect_args={"check_same_thread": False},
+		poolclass=StaticPool,
+	)
+	SQLModel.metadata.create_all(engine)
+	return Session(engine)
+
+def add_user(session: Session, username: str) -> UserInDB:
+	user = UserInDB(username=username, email=f"{username}@example.com", hashed_password="x")
+	session.add(user)
+	session.commit()
+	session.refresh(user)
+	return user
+
+def add_chat(session: Session, owner: UserInDB) -> ChatInDB:
+	chat = ChatInDB(name="chat", owner_id=owner.id)
+	session.add(chat)
+	session.commit()
+	session.refresh(chat)
+	return chat
+
+def test_chat_counters_follow_writes():
+	session = make_session()
+	owner = add_user(session, "owner")
+	other = add_user(session, "other")
+	chat = add_chat(session, owner)
+
+	db.add_chat_member(session, chat.id, owner.id)
+	db.add_chat_member(session, chat.id, other.id)
+	db.create_new_message(session, MessageCreate(text="hello"), owner, chat.id)
+	db.create_new_message(session, MessageCreate(text="hi"), other, chat.id)
+	db.remove_chat_member(session, chat.id, other.id)
+
+	summary = db.get_chat_summary(session, chat.id)
+	assert (summary.message_count, summary.user_count) == (2, 1)
+
+def test_recompute_counters_fixes_drift():
+	session = make_session()
+	owner = add_user(session, "owner")
+	chat = add_chat(session, owner)
+	db.create_new_message(session, MessageCreate(text="hello"), owner, chat.id)
+
+	chat.message_count = 42
+	session.add(chat)
+	session.commit()
+
+	assert recompute_counters(session.get_bind()) == 1
+	session.expire_all()
+	assert db.get_chat_summary(session, chat.id).message_count == 1
@@ -107,4 +107,54 @@ def test_get_chat_users_invalid_id():
 	"""Test response for `GET /chats/invalid_id/users."""
 	test_client = TestClient(app)
 	invalid_id = "invalid_id"
-	response = test_client.get(f"/chats/{invalid_id}/users")
\ No newline at end of file
+	response = test_client.get(f"/chats/{invalid_id}/users")
+
+def test_get_messages_pages_with_cursors():
+	"""Test that `GET /chats/{chat_id}/messages` pages follow next/prev cursors."""
+	client = TestClient(app)
+	response = client.get("/chats/1/messages", params={"limit": 2})
+	assert response.status_code == 200
+	first = response.json()
+	assert first["meta"]["count"] == len(first["messages"]) == 2
+	assert first["meta"]["prev_cursor"] is None
+
+	response = client.get("/chats/1/messages", params={"limit": 2, "after": first["meta"]["next_cursor"]})
+	assert response.status_code == 200
+	second = response.json()
+	assert first["messages"][-1]["created_at"] <= second["messages"][0]["created_at"]
+	assert {m["id"] for m in first["messages"]}.isdisjoint(m["id"] for m in second["messages"])
+
+	response = client.get("/chats/1/messages", params={"limit": 2, "before": second["meta"]["prev_cursor"]})
+	assert response.status_code == 200
+	assert response.json()["messages"] == first["messages"]
+
+def test_get_messages_invalid_cursor():
+	"""Test response for `GET /chats/{chat_id}/messages` with a malformed cursor."""
+	client = TestClient(app)
+	response = client.get("/chats/1/messages", params={"after": "not-a-cursor"})
+	assert response.status_code == 422
+	assert response.json()["detail"]["type"] == "invalid_cursor"
+
+def test_get_all_chats_limit_offset():
+	"""Test that `GET /chats` slices in sort order and counts every chat."""
+	client = TestClient(app)
+	all_chats = client.get("/chats").json()["chats"]
+
+	response = client.get("/chats", params={"limit": 2, "offset": 1})
+	assert response.status_code == 200
+	assert response.json()["meta"]["count"] == len(all_chats)
+	assert response.json()["chats"] == all_chats[1:3]
+
+def test_get_chat_by_id_counts_match_includes():
+	"""Test that `GET /chats/{chat_id}` counts agree with the included collections."""
+	client = TestClient(app)
+	response = client.get("/chats/1", params={"include": ["messages", "users"]})
+	assert response.status_code == 200
+	data = response.json()
+	assert data["meta"]["message_count"] == len(data["messages"])
+	assert data["meta"]["user_count"] == len(data["users"])
+
+	response = client.get("/chats/1")
+	assert response.status_code == 200
+	assert response.json()["meta"] == data["meta"]
+	assert "messages" not in response.json()
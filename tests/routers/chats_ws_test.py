@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+from starlette.websockets import WebSocketDisconnect
+
+from backend import database as db
+from backend.broker import Broker
+from backend.main import app
+from backend.models.entities import ChatInDB
+
+@pytest.fixture
+def client():
+	engine = create_engine(
+		"sqlite://",
+		connect_args={"check_same_thread": False},
+		poolclass=StaticPool,
+	)
+	SQLModel.metadata.create_all(engine)
+
+	def get_session():
+		with Session(engine) as session:
+			yield session
+
+	async def get_async_session():
+		with Session(engine) as session:
+			yield db.ThreadpoolSession(session)
+
+	app.dependency_overrides[db.get_session] = get_session
+	app.dependency_overrides[db.get_async_session] = get_async_session
+	client = TestClient(app)
+	client.post("/auth/registration", json={
+		"username": "sarah", "email": "sarah@example.com", "password": "password"
+	})
+	with Session(engine) as session:
+		session.add(ChatInDB(name="skynet", owner_id=1))
+		session.commit()
+	yield client
+	app.dependency_overrides.clear()
+
+def get_token(client: TestClient) -> str:
+	response = client.post("/auth/token", data={"username": "sarah", "password": "password"})
+	return response.json()["access_token"]
+
+def test_websocket_receives_new_messages(client):
+	token = get_token(client)
+	with client.websocket_connect(f"/chats/1/ws?token={token}") as websocket:
+		response = client.post(
+			"/chats/1/messages",
+			json={"text": "hello"},
+			headers={"Authorization": f"Bearer {token}"},
+		)
+		assert response.status_code == 201
+		event = websocket.receive_json()
+		assert event["type"] == "message"
+		assert event["message"] == response.json()["message"]
+
+def test_websocket_rejects_invalid_token(client):
+	with pytest.raises(WebSocketDisconnect) as disconnect:
+		with client.websocket_connect("/chats/1/ws?token=nope") as websocket:
+			websocket.receive_json()
+	assert disconnect.value.code == 1008
+
+def test_broker_drops_slow_subscribers():
+	async def run():
+		broker = Broker(maxsize=2)
+		subscription = broker.subscribe(1)
+		for i in range(3):
+			assert broker.publish(1, {"i": i}) == 1
+		await asyncio.sleep(0)
+		assert subscription.dropped
+		assert await subscription.get() is None
+
+	asyncio.run(run())